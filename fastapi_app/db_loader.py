@@ -15,14 +15,17 @@ This module is responsible for one-time database initialization and
 bootstrap loading of text documents into PostgreSQL.
 
 Responsibilities:
-- Create required database schema (documents, analyses)
+- Create required database schema (documents, analyses, analysis_cache)
 - Load UTF-8 `.txt` files from a mounted directory into the database
 - Ensure idempotent execution under concurrent startup scenarios
-- Safely align auto-increment sequences after manual inserts
+- Only (re)load documents that are new or changed since the last load
 
 Concurrency & deployment guarantees:
 - Uses PostgreSQL advisory locks to ensure only one process performs
-  schema creation and initial data loading
+  schema creation; the lock is held only around the schema and corpus
+  checks, not during the bulk load
+- DDL only runs when part of the schema is missing, and the corpus is
+  only re-read when its directory listing (name, size, mtime) changed
 - Designed for multi-replica Docker / Kubernetes deployments
 - Intended to be triggered during FastAPI startup
 
@@ -31,10 +34,13 @@ used directly by request handlers.
 """
 
 import os
+import asyncio
+import hashlib
 import logging
 import json
 from pathlib import Path
 
+import aiofiles
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncEngine
 
@@ -47,6 +53,15 @@ TEXT_DIR = Path("/app/texts")
 # Fixed advisory lock key to serialize DB initialization across replicas
 DB_INIT_ADVISORY_LOCK_KEY = 1234567890
 
+# Upper bound on how long schema migrations wait for their table lock. ALTER TABLE
+# takes ACCESS EXCLUSIVE, which would otherwise queue every query behind a
+# long-running read on the same table during rolling deploys.
+DDL_LOCK_TIMEOUT = os.getenv("DB_DDL_LOCK_TIMEOUT", "5s")
+
+# Maximum number of corpus files open at once while loading, kept well below
+# the container's open-file (nofile) limit
+FILE_READ_CONCURRENCY = int(os.getenv("DB_FILE_READ_CONCURRENCY", "32"))
+
 # Shared async SQLAlchemy engine injected at runtime
 _engine: AsyncEngine | None = None
 
@@ -65,26 +80,293 @@ def set_engine(engine: AsyncEngine):
     _engine = engine
 
 
-async def _set_documents_sequence(conn):
+async def _read_file(file: Path, semaphore: asyncio.Semaphore):
+    """
+    Read a single file asynchronously and return (filename, raw bytes).
+
+    The semaphore is held from open to close, bounding how many files are
+    open at the same time.
+    """
+    async with semaphore:
+        async with aiofiles.open(file, "rb") as fh:
+            return file.name, await fh.read()
+
+
+async def _read_txt_files(files):
+    """
+    Read `.txt` files concurrently.
+
+    Returns (records, failed): the (filename, content) records, and the
+    number of files that could not be read because of an OS-level error.
+
+    All reads are fanned out with asyncio.gather over aiofiles so disk I/O
+    overlaps and the event loop is never blocked, with at most
+    FILE_READ_CONCURRENCY files open at once. Files that are not valid
+    UTF-8 are skipped for good; files that cannot be read are skipped but
+    counted in `failed`, so the caller can retry them on a later load.
+    """
+    semaphore = asyncio.Semaphore(FILE_READ_CONCURRENCY)
+    results = await asyncio.gather(*[_read_file(file, semaphore) for file in files], return_exceptions=True)
+
+    records = []
+    failed = 0
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            logger.warning("Skipping unreadable file %s: %s", file, result)
+            failed += 1
+            continue
+        name, raw = result
+        try:
+            records.append((name, raw.decode("utf-8")))
+        except UnicodeDecodeError:
+            logger.warning("Skipping non-UTF-8 file: %s", file)
+    return records, failed
+
+
+async def _executemany_upsert_documents(conn, records):
+    """
+    Upsert (filename, content) records with a single executemany call.
+
+    Passing a list of parameter sets makes SQLAlchemy dispatch one
+    executemany, which the driver pipelines instead of paying a full
+    round-trip per file.
+    """
+    # Idempotent upsert by filename
+    await conn.execute(
+        text("""
+            INSERT INTO documents (filename, content)
+            VALUES (:fn, :content)
+            ON CONFLICT (filename) DO UPDATE
+            SET content = EXCLUDED.content;
+        """),
+        [{"fn": name, "content": content} for name, content in records]
+    )
+
+
+async def _copy_upsert_documents(conn, records):
+    """
+    Bulk upsert (filename, content) records into the documents table.
+
+    Rows are streamed into a transaction-scoped staging table using the
+    PostgreSQL COPY protocol, then merged into documents with a single
+    filename-based upsert. This replaces one network round-trip per file
+    with a constant number of statements.
+
+    See _upsert_documents for the executemany fallback.
+    """
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+
+    await conn.execute(text("""
+        CREATE TEMP TABLE _stage_documents (
+            filename TEXT,
+            content TEXT
+        ) ON COMMIT DROP;
+    """))
+
+    await driver_conn.copy_records_to_table(
+        "_stage_documents",
+        records=records,
+        columns=("filename", "content"),
+    )
+
+    # Idempotent upsert by filename
+    await conn.execute(text("""
+        INSERT INTO documents (filename, content)
+        SELECT filename, content FROM _stage_documents
+        ON CONFLICT (filename) DO UPDATE
+        SET content = EXCLUDED.content;
+    """))
+
+
+async def _column_exists(conn, table: str, column: str) -> bool:
+    """
+    Check the catalog for a column (no table lock, unlike ALTER ... IF NOT EXISTS).
+    """
+    return bool(await conn.scalar(
+        text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = :table
+                  AND column_name = :column
+            );
+        """),
+        {"table": table, "column": column}
+    ))
+
+
+async def _add_column_if_missing(conn, table: str, column: str, definition: str):
+    """
+    Add a column only when the catalog says it is missing.
+
+    PostgreSQL takes the ACCESS EXCLUSIVE lock before evaluating
+    ADD COLUMN IF NOT EXISTS, so the ALTER is issued only when needed and
+    with a short lock_timeout: a migration that cannot get its lock fails
+    fast instead of stalling live traffic queued behind it.
+    """
+    if await _column_exists(conn, table, column):
+        return
+
+    await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}';"))
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition};"))
+
+
+async def _upsert_documents(conn, records):
+    """
+    Upsert records via COPY, falling back to executemany if COPY fails.
+
+    COPY runs inside a savepoint, so a failure (e.g. a connection pooler
+    or proxy that does not support the COPY protocol) rolls back only the
+    staging work and the same transaction continues with executemany.
+    """
+    try:
+        async with conn.begin_nested():
+            await _copy_upsert_documents(conn, records)
+    except Exception:
+        logger.warning("COPY bulk load failed, falling back to executemany.", exc_info=True)
+        await _executemany_upsert_documents(conn, records)
+
+
+async def _create_schema(conn):
+    """
+    Create required tables and indexes if missing (idempotent DDL).
+    """
+    # Create primary documents table
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id SERIAL PRIMARY KEY,
+            filename TEXT UNIQUE,
+            content TEXT
+        );
+    """))
+
+    # Create analyses table with cascade semantics
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS analyses (
+            id SERIAL PRIMARY KEY,
+            document_id INTEGER UNIQUE REFERENCES documents(id) ON DELETE CASCADE,
+            tokens JSONB,
+            lemmas JSONB,
+            morphs JSONB,
+            dependencies JSONB,
+            entities JSONB,
+            word_vectors JSONB
+        );
+    """))
+
+    # Index for fast document (analysis lookup)
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_analyses_document_id
+        ON analyses(document_id);
+    """))
+
+    # Content hashes backing HTTP ETags: computed by PostgreSQL for documents
+    # (covers uploads, COPY loads and upserts), written by the API for analyses.
+    # Adding the STORED generated column rewrites documents once, on the first
+    # start against a database that predates it.
+    await _add_column_if_missing(
+        conn, "documents", "content_hash", "TEXT GENERATED ALWAYS AS (md5(content)) STORED"
+    )
+
+    await _add_column_if_missing(conn, "analyses", "content_hash", "TEXT")
+
+    # Content-hash keyed cache of transient analyses (shared across replicas),
+    # rows expire by age (see ANALYSIS_CACHE_TTL_HOURS in main)
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            hash TEXT PRIMARY KEY,
+            payload JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """))
+
+    await _add_column_if_missing(conn, "analysis_cache", "created_at", "TIMESTAMPTZ NOT NULL DEFAULT now()")
+
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_cache_created_at
+        ON analysis_cache(created_at);
+    """))
+
+    # Loader bookkeeping (fingerprint of the last loaded corpus)
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS loader_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """))
+
+
+async def _schema_is_current(conn) -> bool:
     """
-    Align the documents.id sequence with the current maximum ID.
+    Return True when every object created by _create_schema already exists.
+
+    Catalog lookups take no table locks, so replicas starting against an
+    up-to-date database never issue DDL. Keep in sync with _create_schema.
+    """
+    return bool(await conn.scalar(text("""
+        SELECT to_regclass('documents') IS NOT NULL
+           AND to_regclass('analyses') IS NOT NULL
+           AND to_regclass('analysis_cache') IS NOT NULL
+           AND to_regclass('loader_state') IS NOT NULL
+           AND to_regclass('idx_analyses_document_id') IS NOT NULL
+           AND to_regclass('idx_analysis_cache_created_at') IS NOT NULL
+           AND (
+               SELECT count(*) FROM information_schema.columns
+               WHERE table_schema = current_schema()
+                 AND (table_name, column_name) IN (
+                     ('documents', 'content_hash'),
+                     ('analyses', 'content_hash'),
+                     ('analysis_cache', 'created_at')
+                 )
+           ) = 3;
+    """)))
+
+
+def _corpus_fingerprint(files) -> str:
+    """
+    Fingerprint the corpus directory listing from (name, size, mtime) only.
+
+    Comparing it with the fingerprint stored by the last load lets a
+    restart skip reading and hashing every file when nothing changed.
+    """
+    digest = hashlib.md5()
+    for file in files:
+        st = file.stat()
+        digest.update(f"{file.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def _stored_corpus_fingerprint(conn):
+    """
+    Return the corpus fingerprint recorded by the last successful load.
+    """
+    return await conn.scalar(text("SELECT value FROM loader_state WHERE key = 'corpus_fingerprint';"))
+
 
-    This is required because documents may be inserted with explicit IDs
-    or via upserts, which can desynchronize PostgreSQL sequences and
-    cause primary key collisions on subsequent inserts.
+async def _store_corpus_fingerprint(conn, fingerprint: str):
+    """
+    Record the fingerprint of the corpus that was just loaded.
     """
-    res = await conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM documents;"))
-    
-    max_id_row = res.fetchone()
-    
-    max_id = max_id_row[0] if max_id_row and max_id_row[0] is not None else 0
-    
     await conn.execute(
-        text("SELECT setval(pg_get_serial_sequence('documents', 'id'), :val, true);"),
-        {"val": max_id}
+        text("""
+            INSERT INTO loader_state (key, value)
+            VALUES ('corpus_fingerprint', :fp)
+            ON CONFLICT (key) DO UPDATE
+            SET value = EXCLUDED.value;
+        """),
+        {"fp": fingerprint}
     )
 
 
+async def _stored_document_digests(conn):
+    """
+    Return {filename: content_hash} (md5 of content) for stored documents.
+    """
+    res = await conn.execute(text("SELECT filename, content_hash FROM documents;"))
+    return {row[0]: row[1] for row in res.fetchall()}
+
+
 async def load_txt_files_to_db():
     """
     Initialize database schema and load text corpus into PostgreSQL.
@@ -92,9 +374,22 @@ async def load_txt_files_to_db():
     Execution model:
     - Acquires a PostgreSQL advisory lock (non-blocking)
     - If lock is unavailable, exits immediately (another worker won)
-    - Creates required tables and indexes if missing
-    - Loads UTF-8 `.txt` files from TEXT_DIR using filename-based upserts
-    - Realigns auto-increment sequences for consistency
+    - Creates tables and indexes only if part of the schema is missing
+    - Compares the corpus directory fingerprint with the one recorded by
+      the last load; if unchanged, stops without reading any file
+    - Otherwise snapshots the digests of already-stored documents
+    - Releases the lock before any bulk work
+    - Reads UTF-8 `.txt` files from TEXT_DIR concurrently and keeps only
+      new or modified ones
+    - Bulk-loads them via COPY and a single filename-based upsert, and
+      records the new fingerprint in the same transaction
+
+    Restarting against an already-populated database therefore costs a few
+    catalog lookups and one stat() per file.
+
+    Document ids always come from the documents SERIAL default, so the
+    sequence never needs realigning (doing so while other replicas insert
+    could hand out ids that are already taken).
 
     This function is safe to call concurrently from multiple processes
     and is designed to run during application startup.
@@ -102,7 +397,12 @@ async def load_txt_files_to_db():
     if _engine is None:
         raise RuntimeError("DB engine not set. Call set_engine(engine) before load_txt_files_to_db().")
 
-    async with _engine.begin() as conn:
+    if TEXT_DIR.exists() and TEXT_DIR.is_dir():
+        files = sorted(TEXT_DIR.glob("*.txt"))
+    else:
+        files = None
+
+    async with _engine.connect() as conn:
         # Attempt to acquire advisory lock to serialize initialization
         res = await conn.execute(text("SELECT pg_try_advisory_lock(:k);"), {"k": DB_INIT_ADVISORY_LOCK_KEY})
         
@@ -110,66 +410,59 @@ async def load_txt_files_to_db():
         
         locked = bool(locked_row[0]) if locked_row and locked_row[0] is not None else False
 
+        await conn.commit()
+
         if not locked:
             logger.info("✅ Another worker already initialized the DB, skipping.")
             return
 
-        # Create primary documents table
-        await conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                filename TEXT UNIQUE,
-                content TEXT
-            );
-        """))
-
-        # Create analyses table with cascade semantics
-        await conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS analyses (
-                id SERIAL PRIMARY KEY,
-                document_id INTEGER UNIQUE REFERENCES documents(id) ON DELETE CASCADE,
-                tokens JSONB,
-                lemmas JSONB,
-                morphs JSONB,
-                dependencies JSONB,
-                entities JSONB,
-                word_vectors JSONB
-            );
-        """))
+        try:
+            if not await _schema_is_current(conn):
+                await _create_schema(conn)
+                logger.info("✅ Database schema created/updated.")
 
-        # Index for fast document (analysis lookup)
-        await conn.execute(text("""
-            CREATE INDEX IF NOT EXISTS idx_analyses_document_id
-            ON analyses(document_id);
-        """))
+            fingerprint = _corpus_fingerprint(files) if files is not None else None
 
-        # Load text corpus from mounted directory
-        if not TEXT_DIR.exists() or not TEXT_DIR.is_dir():
-            logger.warning("Text directory %s does not exist or is not a directory.", TEXT_DIR)
+            up_to_date = files is None or fingerprint == await _stored_corpus_fingerprint(conn)
+
+            stored = {} if up_to_date else await _stored_document_digests(conn)
+
+            await conn.commit()
+        finally:
+            # Session-level lock: release explicitly before the connection returns to the pool
+            # (the rollback is a no-op after a successful commit and clears an aborted transaction)
+            await conn.rollback()
+            await conn.execute(text("SELECT pg_advisory_unlock(:k);"), {"k": DB_INIT_ADVISORY_LOCK_KEY})
+            await conn.commit()
+
+    # Load text corpus from mounted directory
+    if files is None:
+        logger.warning("Text directory %s does not exist or is not a directory.", TEXT_DIR)
+        return
+
+    if up_to_date:
+        logger.info("✅ Database schema ready, corpus of %d files unchanged since last load.", len(files))
+        return
+
+    records, failed = await _read_txt_files(files)
+
+    changed = [
+        (name, content) for name, content in records
+        if stored.get(name) != hashlib.md5(content.encode("utf-8")).hexdigest()
+    ]
+
+    async with _engine.begin() as conn:
+        if changed:
+            await _upsert_documents(conn, changed)
+
+        # A read error may be transient: leave the fingerprint unchanged so the
+        # next start re-reads the corpus instead of treating it as loaded
+        if failed:
+            logger.warning("%d file(s) could not be read, corpus will be re-checked on next start.", failed)
         else:
-            for file in sorted(TEXT_DIR.glob("*.txt")):
-                try:
-                    with file.open("r", encoding="utf-8") as fh:
-                        content = fh.read()
-                except UnicodeDecodeError:
-                    logger.warning("Skipping non-UTF-8 file: %s", file)
-                    continue
-
-                # Idempotent upsert by filename
-                await conn.execute(
-                    text("""
-                        INSERT INTO documents (filename, content)
-                        VALUES (:fn, :content)
-                        ON CONFLICT (filename) DO UPDATE
-                        SET content = EXCLUDED.content;
-                    """),
-                    {"fn": file.name, "content": content}
-                )
-
-        # Ensure sequence consistency after bulk inserts
-        await _set_documents_sequence(conn)
-
-    logger.info("✅ Database initialized and TXT files loaded successfully.")
+            await _store_corpus_fingerprint(conn, fingerprint)
+
+    logger.info("✅ Database initialized and %d new/modified TXT files loaded successfully.", len(changed))
 
 
 if __name__ == "__main__":
@@ -13,18 +13,21 @@
 
 This module implements a fully asynchronous NLP processing service using FastAPI.
 It integrates:
-- spaCy (en_core_web_lg) for linguistic analysis
+- spaCy (en_core_web_md by default, configurable via SPACY_MODEL) for linguistic analysis
 - PostgreSQL for document and analysis persistence
 - Async SQLAlchemy + asyncpg for non-blocking DB access
+- Native asyncpg pool (prepared statement cache) for hot read-only queries
 - Docker-friendly startup/shutdown lifecycle hooks
-- Datadog APM auto-instrumentation via ddtrace
+- Datadog APM auto-instrumentation via ddtrace (opt-in with DD_TRACE_ENABLED=true)
 
 Key design principles:
-- Fully async I/O (DB, HTTP) with explicit offloading of CPU-bound NLP work
+- Fully async I/O (DB, HTTP) on uvloop with explicit offloading of CPU-bound NLP work
 - Single-load spaCy model per process to minimize memory footprint
+- Micro-batched spaCy inference (nlp.pipe) for concurrent analysis requests
 - Safe concurrent startup with DB readiness checks and advisory locks
 - Database initialization is safe under multi-replica deployments
 - Stateless API endpoints with optional persistent analysis storage
+- Content-hash keyed analysis cache to skip repeated spaCy work
 - Graceful shutdown and resource cleanup
 
 This file intentionally avoids ORM models in favor of explicit SQL for:
@@ -35,22 +38,40 @@ This file intentionally avoids ORM models in favor of explicit SQL for:
 All code paths are production-hardened and container-ready.
 """
 
-from ddtrace import patch_all
-patch_all()  # Enables automatic APM instrumentation (FastAPI, SQLAlchemy, HTTP clients)
-
 import os
-import json
+
+# Pin BLAS/OpenMP to one thread per process before numpy/spaCy are imported:
+# parallelism comes from uvicorn workers and nlp.pipe batching, not from
+# per-matmul threads that would oversubscribe cores under the threadpool
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+# Datadog APM is opt-in: instrumentation is only loaded when explicitly enabled
+if os.getenv("DD_TRACE_ENABLED", "false").lower() == "true":
+    from ddtrace import patch_all
+    patch_all()  # Enables automatic APM instrumentation (FastAPI, SQLAlchemy, HTTP clients)
+
+import uvloop
+uvloop.install()  # libuv-based event loop policy, installed before any loop/engine is created
+
 import logging
+import hashlib
 import threading
 import asyncio
-from io import BytesIO
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import spacy
+import asyncpg
+import orjson
+from spacy.attrs import ORTH, LEMMA, DEP, HEAD, MORPH
+from spacy.tokens import MorphAnalysis
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, status
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy import text
 
@@ -72,13 +93,24 @@ app = FastAPI(
 
     description="This NLP Pipeline API is powered by FastAPI, spaCy, PostgreSQL and SQLAlchemy.",
     
-    version="1.0.0")
+    version="1.0.0",
+
+    # orjson-backed responses: large analysis payloads serialize far faster than with stdlib json
+    default_response_class=ORJSONResponse)
 
 # -------------------------------------------------------------------------
 # spaCy model lifecycle management (single load per process)
 # -------------------------------------------------------------------------
 
 
+# Model name is configurable; en_core_web_md provides the word vectors needed
+# for vector norms at a fraction of en_core_web_lg's memory footprint
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_md")
+
+# Components each lightweight endpoint actually needs (all others are skipped)
+TOKENIZE_PIPES: list[str] = []
+ENTITIES_PIPES = ["ner"]
+
 nlp_model = None
 nlp_lock = threading.Lock()
 
@@ -88,60 +120,259 @@ def get_nlp():
     Lazily load and return the global spaCy model.
 
     The model is loaded once per process and shared across requests.
-    A threading lock ensures safe initialization under concurrent access.
+    Double-checked locking keeps the hot path lock-free once the model is
+    loaded (normally pre-warmed at startup); the threading lock is only
+    taken to serialize the first initialization.
 
     This approach avoids:
     - Per-request model loading (high latency)
+    - Per-request lock acquisition on the CPU-bound hot path
     - Excessive memory usage in production containers
     """
     global nlp_model
+    model = nlp_model
+    if model is not None:
+        return model
+
     with nlp_lock:
         if nlp_model is None:
-            logger.info("Loading spaCy model en_core_web_lg ...")
-            nlp_model = spacy.load("en_core_web_lg")
+            logger.info("Loading spaCy model %s ...", SPACY_MODEL)
+            nlp_model = spacy.load(SPACY_MODEL)
             logger.info("spaCy model loaded.")
-    return nlp_model
+        return nlp_model
 
 
-def run_nlp_analysis_sync(text: str):
+def _doc_to_analysis(doc):
     """
-    Perform synchronous NLP analysis using spaCy.
+    Convert a processed spaCy Doc into the JSON-serializable analysis payload.
 
-    This function is intentionally blocking and CPU-bound.
-    It is executed in a threadpool by the async wrapper.
+    Token attributes are pulled in one shot with Doc.to_array, and each
+    distinct string/morphology ID is resolved only once, instead of reading
+    several Python attributes per token across multiple passes. Vector
+    lookups and norms are computed with vectorized numpy operations.
+    """
+    vocab = doc.vocab
+    n = len(doc)
 
-    Returned data is JSON-serializable and safe for persistence.
-    """    
-    nlp = get_nlp()
-    doc = nlp(text)
+    attrs = doc.to_array([ORTH, LEMMA, DEP, MORPH])
+    orth_ids = attrs[:, 0].tolist()
+    lemma_ids = attrs[:, 1].tolist()
+    dep_ids = attrs[:, 2].tolist()
+    morph_ids = attrs[:, 3].tolist()
+
+    # HEAD is stored as a signed offset to the head token inside a uint64 array
+    head_index = (np.arange(n, dtype=np.int64) + doc.to_array(HEAD).view(np.int64)).tolist()
 
-    word_vectors = []
-    for token in doc:
-        word_vectors.append({
-            "token": token.text,
-            "has_vector": bool(token.has_vector),
-            "vector_norm": float(token.vector_norm) if token.has_vector else None,
-            "is_oov": bool(token.is_oov),
-        })
+    string_of = {key: vocab.strings[key] for key in set(orth_ids) | set(lemma_ids) | set(dep_ids)}
+    morph_of = {key: MorphAnalysis.from_id(vocab, key).to_dict() for key in set(morph_ids)}
+
+    tokens = [string_of[key] for key in orth_ids]
+
+    vectors = vocab.vectors
+    if vectors.size == 0 and doc.tensor.size != 0:
+        # No static vectors (e.g. *_sm models): spaCy falls back to the context tensor
+        has_vector = np.ones(n, dtype=bool)
+        is_oov = np.ones(n, dtype=bool)
+        norms = np.linalg.norm(doc.tensor, axis=1)
+    else:
+        rows = np.asarray(vectors.find(keys=orth_ids), dtype=np.int64)
+        is_oov = rows < 0
+        has_vector = ~is_oov
+        norms = np.zeros(n, dtype=np.float32)
+        if has_vector.any():
+            norms[has_vector] = np.linalg.norm(vectors.data[rows[has_vector]], axis=1)
+
+    word_vectors = [
+        {
+            "token": token,
+            "has_vector": hv,
+            "vector_norm": norm if hv else None,
+            "is_oov": oov,
+        }
+        for token, hv, norm, oov in zip(tokens, has_vector.tolist(), norms.tolist(), is_oov.tolist())
+    ]
 
     return {
-        "tokens": [token.text for token in doc],
-        "lemmas": [(token.text, token.lemma_) for token in doc],
-        "morphs": [(token.text, token.morph.to_dict()) for token in doc],
-        "dependencies": [(token.text, token.dep_, token.head.text) for token in doc],
+        "tokens": tokens,
+        "lemmas": [(token, string_of[key]) for token, key in zip(tokens, lemma_ids)],
+        "morphs": [(token, morph_of[key]) for token, key in zip(tokens, morph_ids)],
+        "dependencies": [
+            (token, string_of[key], tokens[head])
+            for token, key, head in zip(tokens, dep_ids, head_index)
+        ],
         "entities": [(ent.text, ent.label_) for ent in doc.ents],
         "word_vectors": word_vectors,
     }
 
 
+def run_nlp_analysis_sync(texts: list[str]):
+    """
+    Perform synchronous NLP analysis on a batch of texts using spaCy.
+
+    This function is intentionally blocking and CPU-bound.
+    It is executed in a threadpool by the micro-batching consumer.
+
+    Texts are processed through nlp.pipe so tokenizer/tagger/parser
+    overhead is amortized across the batch. Results are returned in
+    input order and are JSON-serializable and safe for persistence.
+    """
+    nlp = get_nlp()
+    return [_doc_to_analysis(doc) for doc in nlp.pipe(texts, batch_size=NLP_MAX_BATCH, n_process=1)]
+
+
+def run_nlp_pipes_sync(text: str, enable: list[str]):
+    """
+    Run spaCy with only the given pipeline components enabled.
+
+    Components are disabled per call (rather than via nlp.select_pipes)
+    so the shared model is never mutated while the batching consumer
+    runs the full pipeline in another thread.
+    """
+    nlp = get_nlp()
+    return nlp(text, disable=[name for name in nlp.pipe_names if name not in enable])
+
+
+def run_tokenize_sync(text: str):
+    """
+    Tokenize text without running any statistical component.
+    """
+    doc = run_nlp_pipes_sync(text, TOKENIZE_PIPES)
+    return {"tokens": [token.text for token in doc]}
+
+
+def run_entities_sync(text: str):
+    """
+    Extract named entities, running only the NER component.
+    """
+    doc = run_nlp_pipes_sync(text, ENTITIES_PIPES)
+    return {"entities": [(ent.text, ent.label_) for ent in doc.ents]}
+
+
+# -------------------------------------------------------------------------
+# NLP micro-batching (coalesces concurrent analysis requests)
+# -------------------------------------------------------------------------
+
+
+# Upper bound on documents dispatched to nlp.pipe in a single batch
+NLP_MAX_BATCH = int(os.getenv("NLP_MAX_BATCH", "16"))
+
+# Maximum time the consumer waits for more requests before flushing a batch
+NLP_MAX_WAIT_MS = int(os.getenv("NLP_MAX_WAIT_MS", "10"))
+
+nlp_queue: Optional[asyncio.Queue] = None
+nlp_batch_task: Optional[asyncio.Task] = None
+
+
+async def nlp_batch_worker():
+    """
+    Background consumer draining the NLP queue in micro-batches.
+
+    The worker blocks until one request is pending, then keeps collecting
+    requests until NLP_MAX_BATCH items are gathered or NLP_MAX_WAIT_MS has
+    elapsed. The batch is analyzed in a single threadpool call and results
+    are dispatched back to per-request futures. If the batch call raises,
+    each text is re-run on its own so only the failing request receives
+    the exception.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch = [await nlp_queue.get()]
+        deadline = loop.time() + NLP_MAX_WAIT_MS / 1000
+
+        while len(batch) < NLP_MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(nlp_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Callers may have gone away (client disconnect) while queued
+        batch = [(text, future) for text, future in batch if not future.cancelled()]
+        if not batch:
+            continue
+
+        try:
+            results = await asyncio.to_thread(run_nlp_analysis_sync, [text for text, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                logger.exception("NLP analysis failed.")
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(exc)
+                continue
+
+            logger.warning("NLP batch of %d document(s) failed, retrying one by one.", len(batch))
+            for text, future in batch:
+                if future.done():
+                    continue
+                try:
+                    (result,) = await asyncio.to_thread(run_nlp_analysis_sync, [text])
+                except Exception as item_exc:
+                    logger.exception("NLP analysis failed.")
+                    if not future.done():
+                        future.set_exception(item_exc)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            continue
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def start_nlp_batcher():
+    """
+    Create the NLP queue and start its consumer task on the running loop.
+
+    Safe to call multiple times; the consumer is only started once.
+    """
+    global nlp_queue, nlp_batch_task
+    if nlp_batch_task is None or nlp_batch_task.done():
+        nlp_queue = asyncio.Queue()
+        nlp_batch_task = asyncio.create_task(nlp_batch_worker())
+
+
+async def stop_nlp_batcher():
+    """
+    Cancel the NLP consumer task and wait for it to exit.
+    """
+    global nlp_batch_task
+    if nlp_batch_task is not None:
+        nlp_batch_task.cancel()
+        try:
+            await nlp_batch_task
+        except asyncio.CancelledError:
+            pass
+        nlp_batch_task = None
+
+
 async def run_nlp_analysis(text: str):
     """
     Asynchronously execute spaCy analysis without blocking the event loop.
 
-    CPU-bound NLP work is offloaded to a threadpool using asyncio.to_thread,
+    The text is enqueued for the micro-batching consumer, which offloads
+    CPU-bound NLP work to a threadpool via asyncio.to_thread. Concurrent
+    requests are therefore coalesced into a single nlp.pipe call,
     preserving FastAPI throughput under concurrent load.
+
+    Texts longer than nlp.max_length are rejected with 413 before they
+    are enqueued, since spaCy would raise for them mid-batch.
     """
-    return await asyncio.to_thread(run_nlp_analysis_sync, text)
+    max_length = get_nlp().max_length
+    if len(text) > max_length:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Document is too long to analyze ({len(text)} > {max_length} characters).",
+        )
+
+    start_nlp_batcher()
+
+    future = asyncio.get_running_loop().create_future()
+    await nlp_queue.put((text, future))
+    return await future
 
 
 # -------------------------------------------------------------------------
@@ -152,25 +383,73 @@ async def run_nlp_analysis(text: str):
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
 DB_NAME = os.getenv("DB_NAME")
 
 if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_NAME]):
     logger.warning("One or more DB env variables are missing (DB_USER/DB_PASSWORD/DB_HOST/DB_NAME).")
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Pool sizing rule: (pool_size + max_overflow + asyncpg pool max_size) * workers
+# * replicas must stay under PostgreSQL's max_connections. The defaults give
+# (5 + 10 + 10) * 3 replicas = 75 peak connections, leaving headroom under the
+# postgres default of 100 for maintenance sessions and rolling deploys.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-# Engine is configured for moderate concurrency and burst tolerance
+# Engine is configured for burst tolerance: fail fast on pool exhaustion,
+# detect stale connections (NAT / pgbouncer idle drops) before use and
+# recycle long-lived connections periodically
 engine: AsyncEngine = create_async_engine(
     DATABASE_URL,
     echo=False,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=10,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={
+        "server_settings": {"jit": "off"},
+        "statement_cache_size": 1024,
+    },
 )
 
 # Expose engine to db_loader for schema initialization
 db_loader.set_engine(engine)
 
+# Native asyncpg pool for hot small-select endpoints (created on startup).
+# SQLAlchemy remains in charge of the transactional write paths.
+# Kept small: it only serves short single-row/list selects and counts
+# towards the same max_connections budget as the engine pool above.
+DB_FAST_POOL_MIN_SIZE = int(os.getenv("DB_FAST_POOL_MIN_SIZE", "2"))
+DB_FAST_POOL_MAX_SIZE = int(os.getenv("DB_FAST_POOL_MAX_SIZE", "10"))
+
+db_pool: Optional[asyncpg.Pool] = None
+
+
+async def create_db_pool():
+    """
+    Create the native asyncpg pool used by read-only hot paths.
+
+    asyncpg keeps a per-connection prepared statement cache, so repeated
+    small selects skip parse/plan on the server.
+    """
+    global db_pool
+    if db_pool is None:
+        db_pool = await asyncpg.create_pool(
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            min_size=DB_FAST_POOL_MIN_SIZE,
+            max_size=DB_FAST_POOL_MAX_SIZE,
+            statement_cache_size=1024,
+        )
+        logger.info("asyncpg pool created (min=%d, max=%d).", DB_FAST_POOL_MIN_SIZE, DB_FAST_POOL_MAX_SIZE)
+
 
 # -------------------------------------------------------------------------
 # Application startup lifecycle
@@ -194,6 +473,22 @@ async def wait_for_db_ready():
             await asyncio.sleep(1)
 
 
+async def warm_engine_pool():
+    """
+    Open DB_POOL_SIZE SQLAlchemy connections up front.
+
+    SQLAlchemy has no min_size: connections are otherwise created lazily
+    by the first requests. Checking them out concurrently forces the pool
+    to establish all of them before traffic arrives.
+    """
+    async def _ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*[_ping() for _ in range(DB_POOL_SIZE)])
+    logger.info("SQLAlchemy pool warmed with %d connections.", DB_POOL_SIZE)
+
+
 @app.on_event("startup")
 async def startup_event():
     """
@@ -201,18 +496,33 @@ async def startup_event():
 
     Responsibilities:
     - Wait for database readiness
+    - Pre-warm the SQLAlchemy pool and spaCy model so the first
+      requests pay no cold-start cost
+    - Create the native asyncpg pool for hot read paths
+    - Start the NLP micro-batching consumer
     - Initialize schema and seed documents via db_loader
+    - Start the periodic analysis_cache purge
 
     db_loader uses advisory locks to ensure only one instance
     performs initialization in multi-replica deployments.
     """
     await wait_for_db_ready()
 
+    await warm_engine_pool()
+
+    await asyncio.to_thread(get_nlp)
+
+    await create_db_pool()
+
+    start_nlp_batcher()
+
     try:
         await db_loader.load_txt_files_to_db()
     except Exception:
         logger.exception("DB initialization failed on startup. Endpoints may fail if DB not ready.")
 
+    start_analysis_cache_purger()
+
 
 # -------------------------------------------------------------------------
 # Database helper utilities
@@ -223,9 +533,8 @@ async def fetch_all_files():
     """
     Retrieve all stored documents (id + filename only).
     """
-    async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT id, filename FROM documents ORDER BY id;"))
-        rows = result.fetchall()
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch("SELECT id, filename FROM documents ORDER BY id;")
     return [{"id": r[0], "filename": r[1]} for r in rows]
 
 
@@ -233,18 +542,267 @@ async def fetch_document(doc_id: int):
     """
     Fetch a single document by ID, including its full content.
     """
-    async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT id, filename, content FROM documents WHERE id = :id;"), {"id": doc_id})
-        row = result.fetchone()
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow("SELECT id, filename, content, content_hash FROM documents WHERE id = $1;", doc_id)
     return row
 
 
+async def fetch_document_hash(doc_id: int):
+    """
+    Fetch only the content hash of a document (cheap ETag revalidation).
+    """
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval("SELECT content_hash FROM documents WHERE id = $1;", doc_id)
+
+
+async def fetch_analysis_hash(doc_id: int):
+    """
+    Fetch only the content hash of a stored analysis (cheap ETag revalidation).
+    """
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval("SELECT content_hash FROM analyses WHERE document_id = $1;", doc_id)
+
+
+def make_etag(content_hash: Optional[str]) -> Optional[str]:
+    """
+    Build a strong ETag header value from a stored content hash.
+    """
+    return f'"{content_hash}"' if content_hash else None
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """
+    Check whether the client's If-None-Match header matches the given ETag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+# Upper bound on the numeric suffix tried when an uploaded filename is already taken
+MAX_FILENAME_SUFFIX = 10000
+
+
+async def insert_with_free_suffix(conn, stem: str, content: str):
+    """
+    Insert a document as "<stem>_<n>.txt" using the smallest free n.
+
+    Candidate names are generated and probed server-side, so a collision
+    costs one round-trip regardless of how many suffixes are taken.
+    Returns (id, filename), or None if a concurrent insert claimed the
+    chosen name first (ON CONFLICT keeps the transaction usable).
+    """
+    res = await conn.execute(
+        text("""
+            WITH candidates AS (
+                SELECT i, CAST(:stem AS text) || '_' || i || '.txt' AS fn
+                FROM generate_series(1, :max_suffix) AS i
+            )
+            INSERT INTO documents (filename, content)
+            SELECT c.fn, :content
+            FROM candidates c
+            WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.filename = c.fn)
+            ORDER BY c.i
+            LIMIT 1
+            ON CONFLICT (filename) DO NOTHING
+            RETURNING id, filename;
+        """),
+        {"stem": stem, "content": content, "max_suffix": MAX_FILENAME_SUFFIX}
+    )
+    return res.fetchone()
+
+
+# Size (in characters) of each slice encoded and sent by streaming downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def iter_utf8_chunks(content: str):
+    """
+    Lazily encode a string to UTF-8 in fixed-size slices.
+
+    Avoids materializing a full bytes copy of large documents and yields
+    control back to the event loop between chunks.
+    """
+    for start in range(0, len(content), DOWNLOAD_CHUNK_SIZE):
+        yield content[start:start + DOWNLOAD_CHUNK_SIZE].encode("utf-8")
+
+
+def _maybe_load(val):
+    """
+    Return a jsonb column value as Python objects.
+
+    Values already decoded by the driver are passed through untouched;
+    JSON text (str/bytes) is parsed once with orjson.
+    """
+    if val is None or isinstance(val, (dict, list)):
+        return val
+    try:
+        return orjson.loads(val)
+    except orjson.JSONDecodeError:
+        return val
+
+
+# -------------------------------------------------------------------------
+# Analysis cache (content-hash keyed, in-process LRU + analysis_cache table)
+# -------------------------------------------------------------------------
+
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "512"))
+
+# Persistent cache rows older than this are ignored and periodically purged
+ANALYSIS_CACHE_TTL_HOURS = float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "24"))
+ANALYSIS_CACHE_PURGE_INTERVAL = 3600
+
+# Bump whenever _doc_to_analysis changes its output, so cached payloads
+# produced by an older extractor are never served
+ANALYSIS_FORMAT_VERSION = 1
+
+analysis_cache: OrderedDict = OrderedDict()
+
+analysis_cache_purge_task: Optional[asyncio.Task] = None
+
+
+def analysis_cache_key(content: str) -> str:
+    """
+    Build the cache key for a document's content.
+
+    spaCy analysis is deterministic for a given model, so the key combines
+    the model name and version, the extractor format version and a 128-bit
+    BLAKE2b digest of the content. Upgrading either invalidates old rows.
+    """
+    digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    model_version = get_nlp().meta.get("version", "unknown")
+    return f"{SPACY_MODEL}-{model_version}:v{ANALYSIS_FORMAT_VERSION}:{digest}"
+
+
+def _remember_analysis(key: str, analysis):
+    """
+    Insert an analysis into the in-process LRU, evicting the oldest entry.
+    """
+    analysis_cache[key] = analysis
+    analysis_cache.move_to_end(key)
+    if len(analysis_cache) > ANALYSIS_CACHE_SIZE:
+        analysis_cache.popitem(last=False)
+
+
+async def analyze_text_cached(content: str):
+    """
+    Return the NLP analysis for a text, skipping spaCy when already known.
+
+    Lookup order:
+    - In-process LRU (sub-millisecond, per replica)
+    - analysis_cache table (single primary-key lookup, shared, survives
+      restarts, rows expire after ANALYSIS_CACHE_TTL_HOURS)
+    - spaCy via the micro-batching queue, then both caches are populated
+
+    Payload (de)serialization runs in a worker thread since analyses can
+    be several MB. Persistent cache failures are logged and never fail
+    the request.
+    """
+    key = analysis_cache_key(content)
+
+    analysis = analysis_cache.get(key)
+    if analysis is not None:
+        analysis_cache.move_to_end(key)
+        return analysis
+
+    try:
+        async with db_pool.acquire() as conn:
+            payload = await conn.fetchval(
+                """
+                SELECT payload FROM analysis_cache
+                WHERE hash = $1 AND created_at > now() - $2::float8 * interval '1 hour';
+                """,
+                key,
+                ANALYSIS_CACHE_TTL_HOURS,
+            )
+    except Exception:
+        logger.exception("Analysis cache lookup failed, falling back to spaCy.")
+        payload = None
+
+    if payload is not None:
+        analysis = await asyncio.to_thread(orjson.loads, payload)
+        _remember_analysis(key, analysis)
+        return analysis
+
+    analysis = await run_nlp_analysis(content)
+    _remember_analysis(key, analysis)
+
+    try:
+        payload = await asyncio.to_thread(orjson.dumps, analysis)
+        async with db_pool.acquire() as conn:
+            # Refresh expired rows that have not been purged yet
+            await conn.execute(
+                """
+                INSERT INTO analysis_cache (hash, payload) VALUES ($1, $2::jsonb)
+                ON CONFLICT (hash) DO UPDATE
+                SET payload = EXCLUDED.payload, created_at = now();
+                """,
+                key,
+                payload.decode(),
+            )
+    except Exception:
+        logger.exception("Failed to persist analysis to cache.")
+
+    return analysis
+
+
+async def purge_analysis_cache():
+    """
+    Delete persistent cache rows older than ANALYSIS_CACHE_TTL_HOURS.
+    """
+    async with db_pool.acquire() as conn:
+        result = await conn.execute(
+            "DELETE FROM analysis_cache WHERE created_at < now() - $1::float8 * interval '1 hour';",
+            ANALYSIS_CACHE_TTL_HOURS,
+        )
+    logger.info("Analysis cache purge: %s", result)
+
+
+async def analysis_cache_purger():
+    """
+    Background task bounding the analysis_cache table by age.
+    """
+    while True:
+        try:
+            await purge_analysis_cache()
+        except Exception:
+            logger.exception("Analysis cache purge failed.")
+        await asyncio.sleep(ANALYSIS_CACHE_PURGE_INTERVAL)
+
+
+def start_analysis_cache_purger():
+    """
+    Start the periodic analysis_cache purge task (idempotent).
+    """
+    global analysis_cache_purge_task
+    if analysis_cache_purge_task is None or analysis_cache_purge_task.done():
+        analysis_cache_purge_task = asyncio.create_task(analysis_cache_purger())
+
+
+async def stop_analysis_cache_purger():
+    """
+    Cancel the periodic analysis_cache purge task.
+    """
+    global analysis_cache_purge_task
+    if analysis_cache_purge_task is not None:
+        analysis_cache_purge_task.cancel()
+        try:
+            await analysis_cache_purge_task
+        except asyncio.CancelledError:
+            pass
+        analysis_cache_purge_task = None
+
+
 # -------------------------------------------------------------------------
 # API endpoints
 # -------------------------------------------------------------------------
 
 
-@app.get("/", response_class=JSONResponse, tags=['Endpoints'])
+@app.get("/", tags=['Endpoints'])
 async def index():
     """
     Service metadata and endpoint discovery.
@@ -259,6 +817,8 @@ async def index():
             "DELETE /files/{doc_id}": "Delete document (and its analysis via cascade)",
             "GET /download/{doc_id}.txt": "Download raw .txt file for document",
             "GET /analyze/{doc_id}": "Run transient analysis and return results (not stored)",
+            "GET /tokenize/{doc_id}": "Tokenize document only (lightweight, not stored)",
+            "GET /entities/{doc_id}": "Extract named entities only (lightweight, not stored)",
             "POST /analyze-and-store/{doc_id}": "Run analysis and store results in DB",
             "GET /analysis/{doc_id}": "Retrieve stored analysis (JSON)",
             "GET /download-analysis/{doc_id}.json": "Download stored analysis as .json file",
@@ -267,7 +827,7 @@ async def index():
     }
 
 
-@app.get("/files", response_class=JSONResponse, tags=['Endpoints'])
+@app.get("/files", tags=['Endpoints'])
 async def list_txt_files():
     """
     List all uploaded documents.
@@ -280,11 +840,19 @@ async def list_txt_files():
 
 
 @app.get("/files/{doc_id}", tags=['Endpoints'])
-async def view_text(doc_id: int):
+async def view_text(doc_id: int, request: Request, response: Response):
     """
     Retrieve a document's metadata and raw content.
+
+    Supports conditional requests: when If-None-Match matches the stored
+    content hash, a 304 is returned without fetching the content.
     """
     try:
+        if request.headers.get("if-none-match"):
+            etag = make_etag(await fetch_document_hash(doc_id))
+            if etag_matches(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
         row = await fetch_document(doc_id)
     except Exception:
         logger.exception("DB error while fetching document id %s", doc_id)
@@ -293,6 +861,10 @@ async def view_text(doc_id: int):
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
+    etag = make_etag(row[3])
+    if etag:
+        response.headers["ETag"] = etag
+
     return {"id": row[0], "filename": row[1], "content": row[2]}
 
 
@@ -303,9 +875,9 @@ async def upload_text(file: UploadFile = File(...), filename: Optional[str] = Fo
 
     Handles:
     - Filename normalization
-    - Collision-safe naming
-    - Explicit ID assignment with sequence alignment
-    """    
+    - Collision-safe naming (server-side, single INSERT ... RETURNING)
+    - ID assignment by the documents SERIAL sequence
+    """
     orig_name = file.filename or "upload.txt"
 
     if filename:
@@ -324,38 +896,34 @@ async def upload_text(file: UploadFile = File(...), filename: Optional[str] = Fo
         logger.exception("Error reading uploaded file.")
         raise HTTPException(status_code=500, detail="Failed to read uploaded file.")
 
-    async with engine.begin() as conn:
-        result = await conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM documents;"))
-        max_id_row = result.fetchone()
-        next_id = (max_id_row[0] if max_id_row and max_id_row[0] is not None else 0) + 1
-
-        base_name = safe_filename.rsplit("/", 1)[-1]
-        candidate = base_name
-        suffix = 0
-        
-        while True:
-            res = await conn.execute(text("SELECT 1 FROM documents WHERE filename = :fn;"), {"fn": candidate})
-            if not res.fetchone():
-                break
-            suffix += 1
-            candidate = f"{Path(base_name).stem}_{suffix}.txt"
-
-        stored_filename = candidate
+    base_name = safe_filename.rsplit("/", 1)[-1]
 
-        await conn.execute(
+    async with engine.begin() as conn:
+        # Common case: the requested name is free, the SERIAL default assigns the id
+        res = await conn.execute(
             text("""
-                INSERT INTO documents (id, filename, content)
-                VALUES (:id, :filename, :content)
+                INSERT INTO documents (filename, content)
+                VALUES (:fn, :content)
+                ON CONFLICT (filename) DO NOTHING
+                RETURNING id, filename;
             """),
-            {"id": next_id, "filename": stored_filename, "content": content_str}
-        )
-        
-        await conn.execute(
-            text("SELECT setval(pg_get_serial_sequence('documents','id'), :val, true);"),
-            {"val": next_id}
+            {"fn": base_name, "content": content_str}
         )
 
-    return {"id": next_id, "filename": stored_filename}
+        row = res.fetchone()
+
+        if not row:
+            # Name already taken: pick the smallest free suffix server-side
+            row = await insert_with_free_suffix(conn, Path(base_name).stem, content_str)
+
+        if not row:
+            # A concurrent upload claimed the same suffix between probe and insert: retry once
+            row = await insert_with_free_suffix(conn, Path(base_name).stem, content_str)
+
+        if not row:
+            raise HTTPException(status_code=409, detail="Could not allocate a unique filename, please retry.")
+
+    return {"id": row[0], "filename": row[1]}
 
 
 @app.delete("/files/{doc_id}", tags=['Endpoints'])
@@ -363,16 +931,14 @@ async def delete_text(doc_id: int):
     """Delete a document and its analysis (via cascade)."""
     async with engine.begin() as conn:
         
-        res = await conn.execute(text("SELECT filename FROM documents WHERE id = :id;"), {"id": doc_id})
+        res = await conn.execute(text("DELETE FROM documents WHERE id = :id RETURNING filename;"), {"id": doc_id})
         
         row = res.fetchone()
         
-        if not row:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        
-        filename = row[0]
-        
-        await conn.execute(text("DELETE FROM documents WHERE id = :id;"), {"id": doc_id})
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    filename = row[0]
     
     return {"message": f"Document {doc_id} ({filename}) deleted (analysis removed via cascade if present)."}
 
@@ -380,66 +946,83 @@ async def delete_text(doc_id: int):
 @app.get("/download/{doc_id}.txt", tags=['Endpoints'])
 async def download_text(doc_id: int):
     """Download the raw text of a document."""
-    async with engine.connect() as conn:
-        
-        res = await conn.execute(text("SELECT filename, content FROM documents WHERE id = :id;"), {"id": doc_id})
-        
-        row = res.fetchone()
+    row = await fetch_document(doc_id)
 
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    filename, content = row[0], row[1]
-    
-    buffer = BytesIO(content.encode("utf-8"))
+    filename, content = row[1], row[2]
 
     headers = {
         "Content-Disposition": f'attachment; filename="{filename}"',
         "Content-Type": "text/plain; charset=utf-8",
     }
     
-    return StreamingResponse(buffer, headers=headers)
+    return StreamingResponse(iter_utf8_chunks(content), headers=headers)
 
 
 @app.get("/analyze/{doc_id}", tags=['Endpoints'])
 async def analyze_file(doc_id: int):
     """Run NLP analysis without persisting results."""
-    async with engine.connect() as conn:
-        
-        res = await conn.execute(text("SELECT content FROM documents WHERE id = :id;"), {"id": doc_id})
-        
-        row = res.fetchone()
+    row = await fetch_document(doc_id)
 
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    analysis = await run_nlp_analysis(row[0])
+    analysis = await analyze_text_cached(row[2])
     
     return analysis
 
 
+@app.get("/tokenize/{doc_id}", tags=['Endpoints'])
+async def tokenize_file(doc_id: int):
+    """Tokenize a document without running the statistical pipeline."""
+    row = await fetch_document(doc_id)
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    return await asyncio.to_thread(run_tokenize_sync, row[2])
+
+
+@app.get("/entities/{doc_id}", tags=['Endpoints'])
+async def extract_entities(doc_id: int):
+    """Extract named entities using only the NER component."""
+    row = await fetch_document(doc_id)
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    return await asyncio.to_thread(run_entities_sync, row[2])
+
+
 @app.post("/analyze-and-store/{doc_id}", tags=['Endpoints'])
 async def analyze_and_store(doc_id: int):
     """Run NLP analysis and persist results."""
-    async with engine.connect() as conn:
-        
-        res = await conn.execute(
-            text("SELECT content FROM documents WHERE id = :id;"),
-            {"id": doc_id}
-        )
-        
-        row = res.fetchone()
-    
+    row = await fetch_document(doc_id)
+
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    analysis = await run_nlp_analysis(row[0])
+    analysis = await analyze_text_cached(row[2])
+
+    payload = {
+        "tokens": orjson.dumps(analysis["tokens"]).decode(),
+        "lemmas": orjson.dumps(analysis["lemmas"]).decode(),
+        "morphs": orjson.dumps(analysis["morphs"]).decode(),
+        "dependencies": orjson.dumps(analysis["dependencies"]).decode(),
+        "entities": orjson.dumps(analysis["entities"]).decode(),
+        "word_vectors": orjson.dumps(analysis["word_vectors"]).decode(),
+    }
+
+    # Materialized on write so GET endpoints can revalidate with a single lookup
+    content_hash = hashlib.md5("\n".join(payload.values()).encode("utf-8")).hexdigest()
 
     async with engine.begin() as conn:
         await conn.execute(
             text("""
             INSERT INTO analyses (
-                document_id, tokens, lemmas, morphs, dependencies, entities, word_vectors
+                document_id, tokens, lemmas, morphs, dependencies, entities, word_vectors, content_hash
             )
             VALUES (
                 :document_id,
@@ -448,7 +1031,8 @@ async def analyze_and_store(doc_id: int):
                 CAST(:morphs AS jsonb),
                 CAST(:dependencies AS jsonb),
                 CAST(:entities AS jsonb),
-                CAST(:word_vectors AS jsonb)
+                CAST(:word_vectors AS jsonb),
+                :content_hash
             )
             ON CONFLICT (document_id) DO UPDATE
             SET tokens = EXCLUDED.tokens,
@@ -456,29 +1040,27 @@ async def analyze_and_store(doc_id: int):
                 morphs = EXCLUDED.morphs,
                 dependencies = EXCLUDED.dependencies,
                 entities = EXCLUDED.entities,
-                word_vectors = EXCLUDED.word_vectors;
+                word_vectors = EXCLUDED.word_vectors,
+                content_hash = EXCLUDED.content_hash;
             """),
-            {
-                "document_id": doc_id,
-                "tokens": json.dumps(analysis["tokens"], ensure_ascii=False),
-                "lemmas": json.dumps(analysis["lemmas"], ensure_ascii=False),
-                "morphs": json.dumps(analysis["morphs"], ensure_ascii=False),
-                "dependencies": json.dumps(analysis["dependencies"], ensure_ascii=False),
-                "entities": json.dumps(analysis["entities"], ensure_ascii=False),
-                "word_vectors": json.dumps(analysis["word_vectors"], ensure_ascii=False),
-            }
+            {"document_id": doc_id, "content_hash": content_hash, **payload}
         )
 
     return {"message": "Full NLP analysis (with simplified vectors) stored successfully"}
 
 
 @app.get("/analysis/{doc_id}", tags=['Endpoints'])
-async def get_analysis(doc_id: int):
-    """Retrieve stored NLP analysis."""
+async def get_analysis(doc_id: int, request: Request, response: Response):
+    """Retrieve stored NLP analysis (supports If-None-Match revalidation)."""
+    if request.headers.get("if-none-match"):
+        etag = make_etag(await fetch_analysis_hash(doc_id))
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
     async with engine.connect() as conn:
         
         res = await conn.execute(text("""
-            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors
+            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors, content_hash
             FROM analyses
             WHERE document_id = :id;
         """), {"id": doc_id})
@@ -488,15 +1070,9 @@ async def get_analysis(doc_id: int):
     if not row:
         raise HTTPException(status_code=404, detail="Analysis not found for this document.")
 
-    def _maybe_load(val):
-        if val is None:
-            return None
-        if isinstance(val, (dict, list)):
-            return val
-        try:
-            return json.loads(val)
-        except Exception:
-            return val
+    etag = make_etag(row[6])
+    if etag:
+        response.headers["ETag"] = etag
 
     return {
         "tokens": _maybe_load(row[0]),
@@ -509,11 +1085,16 @@ async def get_analysis(doc_id: int):
 
 
 @app.get("/download-analysis/{doc_id}.json", tags=['Endpoints'])
-async def download_analysis(doc_id: int):
-    """Download stored analysis as a JSON file."""
+async def download_analysis(doc_id: int, request: Request):
+    """Download stored analysis as a JSON file (supports If-None-Match revalidation)."""
+    if request.headers.get("if-none-match"):
+        etag = make_etag(await fetch_analysis_hash(doc_id))
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
     async with engine.connect() as conn:
         res = await conn.execute(text("""
-            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors
+            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors, content_hash
             FROM analyses
             WHERE document_id = :id;
         """), {"id": doc_id})
@@ -522,16 +1103,6 @@ async def download_analysis(doc_id: int):
     if not row:
         raise HTTPException(status_code=404, detail="Analysis not found for this document.")
 
-    def _maybe_load(val):
-        if val is None:
-            return None
-        if isinstance(val, (dict, list)):
-            return val
-        try:
-            return json.loads(val)
-        except Exception:
-            return val
-
     analysis_obj = {
         "document_id": doc_id,
         "tokens": _maybe_load(row[0]),
@@ -542,16 +1113,18 @@ async def download_analysis(doc_id: int):
         "word_vectors": _maybe_load(row[5]),
     }
 
-    data_bytes = json.dumps(analysis_obj, ensure_ascii=False, indent=2).encode("utf-8")
-    
-    buffer = BytesIO(data_bytes)
+    data_bytes = orjson.dumps(analysis_obj, option=orjson.OPT_INDENT_2)
     
     headers = {
         "Content-Disposition": f'attachment; filename="analysis_{doc_id}.json"',
         "Content-Type": "application/json; charset=utf-8",
     }
+
+    etag = make_etag(row[6])
+    if etag:
+        headers["ETag"] = etag
     
-    return StreamingResponse(buffer, headers=headers)
+    return Response(content=data_bytes, headers=headers)
 
 
 @app.delete("/analysis/{doc_id}", tags=['Endpoints'])
@@ -559,12 +1132,12 @@ async def delete_analysis(doc_id: int):
     """Delete stored analysis for a document."""
     async with engine.begin() as conn:
         
-        res = await conn.execute(text("SELECT 1 FROM analyses WHERE document_id = :id;"), {"id": doc_id})
-        
-        if not res.fetchone():
-            raise HTTPException(status_code=404, detail="Analysis not found for this document")
+        res = await conn.execute(text("DELETE FROM analyses WHERE document_id = :id RETURNING 1;"), {"id": doc_id})
         
-        await conn.execute(text("DELETE FROM analyses WHERE document_id = :id;"), {"id": doc_id})
+        row = res.fetchone()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Analysis not found for this document")
     
     return {"message": f"Analysis for document {doc_id} deleted successfully."}
 
@@ -575,15 +1148,26 @@ async def shutdown_event():
     Graceful shutdown hook.
 
     Ensures:
-    - Database connection pool is closed
+    - NLP micro-batching consumer and cache purge task are stopped
+    - Database connection pools are closed
     - spaCy model memory is released
     """
     logger.info("Shutting down FastAPI gracefully...")
 
+    await stop_nlp_batcher()
+
+    await stop_analysis_cache_purger()
+
     if 'engine' in globals() and engine is not None:
         await engine.dispose()
         logger.info("Async DB engine disposed.")
 
+    global db_pool
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+        logger.info("asyncpg pool closed.")
+
     global nlp_model
     if nlp_model is not None:
         del nlp_model
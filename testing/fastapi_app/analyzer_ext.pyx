@@ -0,0 +1,59 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# analyzer_ext.pyx
+"""
+Compiled token-attribute extraction for main._extract.
+Reads Doc.c token structs directly instead of going through Token attributes.
+Output shape matches main._extract_py.
+"""
+
+from spacy.tokens.doc cimport Doc
+from spacy.structs cimport TokenC
+
+from spacy.tokens import MorphAnalysis
+
+
+def extract(Doc doc, list has_vec, list norms):
+    cdef int i
+    cdef int n = doc.length
+    cdef const TokenC* tok
+
+    vocab = doc.vocab
+    strings = vocab.strings
+
+    cdef list tokens = [None] * n
+    cdef list lemmas = [None] * n
+    cdef list morphs = [None] * n
+    cdef list deps = [None] * n
+    cdef list word_vectors = [None] * n
+    cdef dict morph_cache = {}
+
+    for i in range(n):
+        tok = &doc.c[i]
+        tokens[i] = strings[tok.lex.orth]
+
+    for i in range(n):
+        tok = &doc.c[i]
+        text = tokens[i]
+        morph = morph_cache.get(tok.morph)
+        if morph is None:
+            morph = MorphAnalysis.from_id(vocab, tok.morph).to_dict()
+            morph_cache[tok.morph] = morph
+        lemmas[i] = (text, strings[tok.lemma])
+        morphs[i] = (text, morph)
+        # head is a relative offset to the head token
+        deps[i] = (text, strings[tok.dep], tokens[i + tok.head])
+        word_vectors[i] = {
+            "token": text,
+            "has_vector": has_vec[i],
+            "vector_norm": norms[i] if has_vec[i] else None,
+            "is_oov": not has_vec[i],
+        }
+
+    return {
+        "tokens": tokens,
+        "lemmas": lemmas,
+        "morphs": morphs,
+        "dependencies": deps,
+        "entities": [(ent.text, ent.label_) for ent in doc.ents],
+        "word_vectors": word_vectors,
+    }
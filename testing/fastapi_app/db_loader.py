@@ -2,7 +2,7 @@
 """
 Async DB loader and initializer using SQLAlchemy async engine (asyncpg).
 - Creates tables if missing.
-- Loads .txt files from TEXT_DIR into documents (upserts by filename).
+- Loads .txt files from TEXT_DIR into documents (COPY + upsert by filename).
 - Aligns documents.id sequence.
 - Uses pg_try_advisory_lock to ensure only one process initializes DB.
 """
@@ -37,6 +37,37 @@ async def _set_documents_sequence(conn):
         {"val": max_id}
     )
 
+async def bulk_insert_documents(conn, rows):
+    """
+    Upsert (filename, content) rows in one COPY round-trip.
+    COPY cannot upsert, so rows go into a transaction-scoped staging table first.
+    """
+    if not rows:
+        return
+
+    raw = await conn.get_raw_connection()
+
+    await conn.execute(text("""
+        CREATE TEMP TABLE _stage_documents (
+            filename TEXT,
+            content TEXT
+        ) ON COMMIT DROP;
+    """))
+
+    await raw.driver_connection.copy_records_to_table(
+        "_stage_documents",
+        records=rows,
+        columns=("filename", "content"),
+    )
+
+    # upsert by filename
+    await conn.execute(text("""
+        INSERT INTO documents (filename, content)
+        SELECT filename, content FROM _stage_documents
+        ON CONFLICT (filename) DO UPDATE
+        SET content = EXCLUDED.content;
+    """))
+
 async def load_txt_files_to_db():
     if _engine is None:
         raise RuntimeError("DB engine not set. Call set_engine(engine) before load_txt_files_to_db().")
@@ -80,28 +111,30 @@ async def load_txt_files_to_db():
             ON analyses(document_id);
         """))
 
+        # Unique filename index: arbiter for ON CONFLICT (filename) in uploads and the loader.
+        # Same name as the constraint index created by "filename TEXT UNIQUE", so this is a
+        # no-op on fresh databases and only backfills tables created without the constraint.
+        # Not CONCURRENTLY: that cannot run inside this init transaction.
+        await conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS documents_filename_key
+            ON documents(filename);
+        """))
+
         # Load .txt files
         if not TEXT_DIR.exists() or not TEXT_DIR.is_dir():
             logger.warning("Text directory %s does not exist or is not a directory.", TEXT_DIR)
         else:
+            rows = []
             for file in sorted(TEXT_DIR.glob("*.txt")):
                 try:
                     with file.open("r", encoding="utf-8") as fh:
-                        content = fh.read()
+                        rows.append((file.name, fh.read()))
                 except UnicodeDecodeError:
                     logger.warning("Skipping non-UTF-8 file: %s", file)
                     continue
 
-                # upsert by filename
-                await conn.execute(
-                    text("""
-                        INSERT INTO documents (filename, content)
-                        VALUES (:fn, :content)
-                        ON CONFLICT (filename) DO UPDATE
-                        SET content = EXCLUDED.content;
-                    """),
-                    {"fn": file.name, "content": content}
-                )
+            # one COPY for all files instead of an INSERT per file
+            await bulk_insert_documents(conn, rows)
 
         # Align sequence
         await _set_documents_sequence(conn)
@@ -3,84 +3,284 @@
 Async FastAPI application for the NLP pipeline using SQLAlchemy async engine (asyncpg).
 - Uses a connection pool.
 - Async endpoints.
-- spaCy model loaded once per process (threadsafe via threading.Lock).
-- CPU-bound spaCy work executed in threadpool (asyncio.to_thread).
+- spaCy model preloaded once per process at startup.
+- CPU-bound spaCy work executed in threadpool (loop.run_in_executor).
+- Concurrent analysis requests micro-batched into a single nlp.pipe() call.
 """
 
 import os
-import json
+
+# Keep BLAS single-threaded: must be set before numpy/spaCy are imported.
+# Each request already runs in its own worker thread; scale with uvicorn --workers.
+for _var in ("OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "OMP_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import codecs
+import hashlib
 import logging
-import threading
 import asyncio
-from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
+from uuid import uuid4
 
+import numpy as np
+import orjson
 import spacy
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from sqlalchemy import text
+from spacy.attrs import ORTH, LEMMA, DEP, HEAD, MORPH
+from spacy.tokens import MorphAnalysis
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form, status
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncEngine
+from sqlalchemy import event, text
 
 #from fastapi_app import db_loader
 
 import db_loader  # async db loader module
 
+try:
+    import analyzer_ext  # compiled token extractor (built from analyzer_ext.pyx via setup.py)
+except ImportError:
+    analyzer_ext = None
+
 logger = logging.getLogger("nlp_pipeline")
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="NLP Pipeline API", version="3.0")
+# orjson serializes the large token/vector payloads much faster than stdlib json
+app = FastAPI(title="NLP Pipeline API", version="3.0", default_response_class=ORJSONResponse)
+
+# Analysis JSON is highly repetitive; compress anything above 1 KiB for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # ---------------------------
 # spaCy model: single load
 # ---------------------------
 nlp_model = None
-nlp_lock = threading.Lock()
+
+# Pipeline components not needed by any response field (sentence boundaries come from the parser)
+SPACY_EXCLUDE = [c.strip() for c in os.getenv("SPACY_EXCLUDE", "senter").split(",") if c.strip()]
+
+
+def load_nlp():
+    """Load the spaCy model; called once per process from startup_event."""
+    logger.info("Loading spaCy model en_core_web_lg (excluding %s) ...", SPACY_EXCLUDE or "nothing")
+    model = spacy.load("en_core_web_lg", exclude=SPACY_EXCLUDE)
+    logger.info("spaCy model loaded.")
+    return model
 
 
 def get_nlp():
-    """
-    Ensure spaCy model is loaded once per process.
-    Thread lock is fine here because loading is CPU-bound and synchronous.
-    """
-    global nlp_model
-    with nlp_lock:
-        if nlp_model is None:
-            logger.info("Loading spaCy model en_core_web_lg ...")
-            nlp_model = spacy.load("en_core_web_lg")
-            logger.info("spaCy model loaded.")
+    """Return the spaCy model preloaded at startup (no locking on the hot path)."""
     return nlp_model
 
 
-def run_nlp_analysis_sync(text: str):
-    """Synchronous spaCy analysis (keeps shape similar to original)."""
-    nlp = get_nlp()
-    doc = nlp(text)
+def _vector_norms(doc):
+    """Look up static vectors for all tokens at once; returns (has_vector, norms) lists."""
+    vectors = doc.vocab.vectors
+    rows = np.asarray(vectors.find(keys=doc.to_array(ORTH).tolist()), dtype=np.int64)
+    has_vec = rows >= 0
+    norms = np.zeros(len(doc), dtype=np.float32)
+    if has_vec.any():
+        norms[has_vec] = np.linalg.norm(vectors.data[rows[has_vec]], axis=1)
+    return has_vec.tolist(), norms.tolist()
 
-    word_vectors = []
-    for token in doc:
-        word_vectors.append({
-            "token": token.text,
-            "has_vector": bool(token.has_vector),
-            "vector_norm": float(token.vector_norm) if token.has_vector else None,
-            "is_oov": bool(token.is_oov),
-        })
+
+def _extract_py(doc, has_vec, norms):
+    """
+    Pure-Python extractor, used when the compiled analyzer_ext is not available.
+    Token attributes are bulk-read with Doc.to_array, then every output list is
+    pre-sized and filled in a single pass.
+    """
+    vocab = doc.vocab
+    strings = vocab.strings
+    n = len(doc)
+
+    arr = doc.to_array([ORTH, LEMMA, DEP, MORPH]).tolist()
+    # HEAD is a signed offset to the head token stored in a uint64 array
+    heads = (np.arange(n, dtype=np.int64) + doc.to_array(HEAD).view(np.int64)).tolist()
+
+    tokens = [None] * n
+    lemmas = [None] * n
+    morphs = [None] * n
+    deps = [None] * n
+    word_vectors = [None] * n
+    morph_cache = {}
+    for i, (orth, lemma, dep, morph) in enumerate(arr):
+        tok = strings[orth]
+        if morph not in morph_cache:
+            morph_cache[morph] = MorphAnalysis.from_id(vocab, morph).to_dict()
+        tokens[i] = tok
+        lemmas[i] = (tok, strings[lemma])
+        morphs[i] = (tok, morph_cache[morph])
+        # head may come later in the doc, so resolve its text from the attribute array
+        deps[i] = (tok, strings[dep], strings[arr[heads[i]][0]])
+        word_vectors[i] = {
+            "token": tok,
+            "has_vector": has_vec[i],
+            "vector_norm": norms[i] if has_vec[i] else None,
+            "is_oov": not has_vec[i],
+        }
 
     return {
-        "tokens": [token.text for token in doc],
-        "lemmas": [(token.text, token.lemma_) for token in doc],
-        "morphs": [(token.text, token.morph.to_dict()) for token in doc],
-        "dependencies": [(token.text, token.dep_, token.head.text) for token in doc],
+        "tokens": tokens,
+        "lemmas": lemmas,
+        "morphs": morphs,
+        "dependencies": deps,
         "entities": [(ent.text, ent.label_) for ent in doc.ents],
         "word_vectors": word_vectors,
     }
 
 
+def _extract(doc):
+    """Convert a processed Doc into the analysis dict (keeps shape similar to original)."""
+    has_vec, norms = _vector_norms(doc)
+    if analyzer_ext is not None:
+        return analyzer_ext.extract(doc, has_vec, norms)
+    return _extract_py(doc, has_vec, norms)
+
+
+def run_nlp_analysis_sync(text: str):
+    """Synchronous spaCy analysis of a single text."""
+    return _extract(get_nlp()(text))
+
+
+def run_nlp_batch_sync(texts: list[str]):
+    """Synchronous spaCy analysis of several texts in one nlp.pipe() pass."""
+    nlp = get_nlp()
+    return [_extract(doc) for doc in nlp.pipe(texts, batch_size=len(texts))]
+
+
+# ---------------------------
+# Request micro-batching
+# ---------------------------
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", "16"))
+NLP_BATCH_WINDOW_MS = int(os.getenv("NLP_BATCH_WINDOW_MS", "75"))
+
+
+class NlpBatcher:
+    """
+    Coalesce concurrent analysis requests into a single nlp.pipe() call.
+    A batch is flushed when it reaches batch_size or when the window expires.
+    """
+
+    def __init__(self, batch_size: int, window_ms: int):
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000
+        self.pending: list[tuple[str, asyncio.Future]] = []
+        self.has_work = asyncio.Event()
+        self.flush_event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for _, fut in self.pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError("NLP batcher stopped."))
+        self.pending.clear()
+
+    async def submit(self, text: str):
+        fut = asyncio.get_running_loop().create_future()
+        self.pending.append((text, fut))
+        self.has_work.set()
+        if len(self.pending) >= self.batch_size:
+            self.flush_event.set()
+        return await fut
+
+    async def _worker(self):
+        # run_in_executor rather than to_thread: no contextvars copy needed per batch
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.has_work.wait()
+            # give concurrent requests a short window to join the batch
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+            if not self.pending:
+                self.has_work.clear()
+            if len(self.pending) < self.batch_size:
+                self.flush_event.clear()
+
+            try:
+                results = await loop.run_in_executor(None, run_nlp_batch_sync, [t for t, _ in batch])
+            except Exception:
+                # one bad text aborts the whole pipe() call: re-run each on its own
+                # so only the failing request gets the exception
+                logger.exception("Batched spaCy analysis failed, retrying texts one by one.")
+                for text, fut in batch:
+                    if fut.done():
+                        continue
+                    try:
+                        result = await loop.run_in_executor(None, run_nlp_analysis_sync, text)
+                    except Exception as exc:
+                        if not fut.done():
+                            fut.set_exception(exc)
+                    else:
+                        if not fut.done():
+                            fut.set_result(result)
+                continue
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+
+nlp_batcher: Optional[NlpBatcher] = None
+
+
 async def run_nlp_analysis(text: str):
     """
-    Run blocking spaCy analysis in a threadpool so the async event loop isn't blocked.
+    Queue text for batched spaCy analysis; falls back to a direct threadpool
+    call if the batcher is not running. Texts over nlp.max_length are
+    rejected with 413 up front, since spaCy would raise for them mid-batch.
     """
-    return await asyncio.to_thread(run_nlp_analysis_sync, text)
+    max_length = get_nlp().max_length
+    if len(text) > max_length:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Document is too long to analyze ({len(text)} > {max_length} characters).",
+        )
+    if nlp_batcher is None:
+        return await asyncio.get_running_loop().run_in_executor(None, run_nlp_analysis_sync, text)
+    return await nlp_batcher.submit(text)
+
+
+# ---------------------------
+# Analysis cache (LRU keyed by content hash)
+# ---------------------------
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+analysis_cache: "OrderedDict[bytes, dict]" = OrderedDict()
+
+
+async def analyze_text_cached(content: str):
+    """Return the analysis for content, reusing a previous result for identical text."""
+    key = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        analysis_cache.move_to_end(key)
+        return cached
+
+    analysis = await run_nlp_analysis(content)
+    if ANALYSIS_CACHE_SIZE > 0:
+        analysis_cache[key] = analysis
+        if len(analysis_cache) > ANALYSIS_CACHE_SIZE:
+            analysis_cache.popitem(last=False)
+    return analysis
 
 
 # ---------------------------
@@ -103,16 +303,82 @@ engine: AsyncEngine = create_async_engine(
     pool_size=10,
     max_overflow=20,
     pool_timeout=30,
+    # SQLAlchemy's prepared-statement cache plus asyncpg's own statement cache (per connection)
+    connect_args={"prepared_statement_cache_size": 1024, "statement_cache_size": 1024},
 )
 
+
+async def _set_jsonb_codec(conn):
+    # jsonb binary wire format is a 0x01 version byte followed by the JSON text
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=lambda value: b"\x01" + orjson.dumps(value),
+        decoder=lambda data: orjson.loads(data[1:]),
+        schema="pg_catalog",
+        format="binary",
+    )
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    """Let asyncpg encode/decode jsonb with orjson, so Python objects are passed straight through."""
+    dbapi_connection.run_async(_set_jsonb_codec)
+
+
 # Make engine available to db_loader
 db_loader.set_engine(engine)
 
 
+# ---------------------------
+# SQL statements (built once so every request reuses the same cached statement)
+# ---------------------------
+SQL_PING = text("SELECT 1")
+SQL_LIST_FILES = text("SELECT id, filename FROM documents ORDER BY id;")
+SQL_FETCH_DOC = text("SELECT id, filename, content FROM documents WHERE id = :id;")
+SQL_FETCH_DOC_CONTENT = text("SELECT content FROM documents WHERE id = :id;")
+SQL_CREATE_UPLOAD_STAGE = text("""
+    CREATE TEMP TABLE _stage_upload (
+        seq INT,
+        chunk TEXT
+    ) ON COMMIT DROP;
+""")
+SQL_INSERT_STAGED_DOC = text("""
+    INSERT INTO documents (filename, content)
+    SELECT :fn, coalesce(string_agg(chunk, '' ORDER BY seq), '') FROM _stage_upload
+    ON CONFLICT (filename) DO NOTHING
+    RETURNING id;
+""")
+SQL_DELETE_DOC = text("DELETE FROM documents WHERE id = :id RETURNING filename;")
+SQL_STORE_ANALYSIS = text("""
+    INSERT INTO analyses (
+        document_id, tokens, lemmas, morphs, dependencies, entities, word_vectors
+    )
+    VALUES (
+        :document_id, :tokens, :lemmas, :morphs, :dependencies, :entities, :word_vectors
+    )
+    ON CONFLICT (document_id) DO UPDATE
+    SET tokens = EXCLUDED.tokens,
+        lemmas = EXCLUDED.lemmas,
+        morphs = EXCLUDED.morphs,
+        dependencies = EXCLUDED.dependencies,
+        entities = EXCLUDED.entities,
+        word_vectors = EXCLUDED.word_vectors;
+""")
+SQL_GET_ANALYSIS = text("""
+    SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors
+    FROM analyses
+    WHERE document_id = :id;
+""")
+SQL_DELETE_ANALYSIS = text("DELETE FROM analyses WHERE document_id = :id RETURNING 1;")
+
+
 # ---------------------------
 # Startup: wait for DB and initialize
 # ---------------------------
 
+# Worker threads for offloaded spaCy/blocking work (each runs single-threaded BLAS)
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "32"))
+
 async def wait_for_db_ready():
     """
     Try connecting until DB is ready. This is async (non-blocking).
@@ -122,7 +388,7 @@ async def wait_for_db_ready():
         try:
             async with engine.connect() as conn:
                 # a lightweight check
-                await conn.execute(text("SELECT 1"))
+                await conn.execute(SQL_PING)
                 return
         except Exception:
             logger.info("⏳ Waiting for database (async)...")
@@ -132,12 +398,25 @@ async def wait_for_db_ready():
 @app.on_event("startup")
 async def startup_event():
     """
+    - Install a sized default thread pool executor
     - Wait for DB
+    - Load the spaCy model in a worker thread (off the request path)
+    - Start the NLP request batcher
     - Run db_loader.load_txt_files_to_db() (async). The db_loader uses pg_try_advisory_lock
       so only one process will initialize the DB.
     """
+    global nlp_batcher, nlp_model
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="nlp-worker"))
+
     await wait_for_db_ready()
 
+    nlp_model = await loop.run_in_executor(None, load_nlp)
+
+    nlp_batcher = NlpBatcher(NLP_BATCH_SIZE, NLP_BATCH_WINDOW_MS)
+    nlp_batcher.start()
+
     try:
         # initialize schema and load .txt files (db_loader is async)
         await db_loader.load_txt_files_to_db()
@@ -149,25 +428,72 @@ async def startup_event():
 # Utility helpers (async)
 # ---------------------------
 
-async def fetch_all_files():
+async def db() -> AsyncIterator[AsyncConnection]:
+    """Dependency: one pooled connection per request."""
     async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT id, filename FROM documents ORDER BY id;"))
-        rows = result.fetchall()
-    return [{"id": r[0], "filename": r[1]} for r in rows]
+        yield conn
 
 
-async def fetch_document(doc_id: int):
-    async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT id, filename, content FROM documents WHERE id = :id;"), {"id": doc_id})
-        row = result.fetchone()
-    return row
+async def dbtx() -> AsyncIterator[AsyncConnection]:
+    """Dependency: one pooled connection per request inside a transaction (rolled back on error)."""
+    async with engine.begin() as conn:
+        yield conn
+
+
+async def fetch_all_files(conn: AsyncConnection):
+    result = await conn.execute(SQL_LIST_FILES)
+    return [{"id": r[0], "filename": r[1]} for r in result.fetchall()]
+
+
+async def fetch_document(conn: AsyncConnection, doc_id: int):
+    result = await conn.execute(SQL_FETCH_DOC, {"id": doc_id})
+    return result.fetchone()
+
+
+# Characters per chunk when streaming document downloads
+DOWNLOAD_CHUNK_CHARS = 64 * 1024
+
+
+async def iter_utf8_chunks(content: str):
+    """Encode a string to UTF-8 slice by slice instead of as one full bytes copy."""
+    for start in range(0, len(content), DOWNLOAD_CHUNK_CHARS):
+        yield content[start:start + DOWNLOAD_CHUNK_CHARS].encode("utf-8")
+
+
+# Bytes read per chunk from uploaded files
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadDecodeState:
+    """Set by iter_upload_chunks when the upload turns out not to be valid UTF-8."""
+    invalid = False
+
+
+async def iter_upload_chunks(file: UploadFile, state: UploadDecodeState):
+    """
+    Yield (seq, text) records decoded from the spooled upload one chunk at a time.
+    An incremental decoder keeps multi-byte characters split across reads intact.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    seq = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield seq, decoder.decode(chunk)
+            seq += 1
+        yield seq, decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        # stop the COPY cleanly; the caller checks the flag and rolls back
+        state.invalid = True
+
+
+ANALYSIS_FIELDS = ("tokens", "lemmas", "morphs", "dependencies", "entities", "word_vectors")
 
 
 # ---------------------------
 # Endpoints (async)
 # ---------------------------
 
-@app.get("/", response_class=JSONResponse)
+@app.get("/")
 async def index():
     return {
         "service": "NLP Pipeline API",
@@ -183,23 +509,44 @@ async def index():
             "GET /analysis/{doc_id}": "Retrieve stored analysis (JSON)",
             "GET /download-analysis/{doc_id}.json": "Download stored analysis as .json file",
             "DELETE /analysis/{doc_id}": "Delete stored analysis for document",
+            "GET /healthz": "Liveness probe",
+            "GET /readyz": "Readiness probe (503 until spaCy model and DB are ready)",
         }
     }
 
 
-@app.get("/files", response_class=JSONResponse)
-async def list_txt_files():
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"ok": True}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until the spaCy model is loaded and the DB answers."""
+    if nlp_model is None:
+        raise HTTPException(status_code=503, detail="spaCy model not loaded yet.")
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(SQL_PING)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database not reachable.")
+    return {"ok": True}
+
+
+@app.get("/files")
+async def list_txt_files(conn: AsyncConnection = Depends(db)):
     try:
-        return await fetch_all_files()
+        return await fetch_all_files(conn)
     except Exception:
         logger.exception("DB error while listing files.")
         raise HTTPException(status_code=500, detail="Database error while listing files.")
 
 
 @app.get("/files/{doc_id}")
-async def view_text(doc_id: int):
+async def view_text(doc_id: int, conn: AsyncConnection = Depends(db)):
     try:
-        row = await fetch_document(doc_id)
+        row = await fetch_document(conn, doc_id)
     except Exception:
         logger.exception("DB error while fetching document id %s", doc_id)
         raise HTTPException(status_code=500, detail="Database error while fetching document.")
@@ -211,7 +558,10 @@ async def view_text(doc_id: int):
 
 
 @app.post("/upload", status_code=status.HTTP_201_CREATED)
-async def upload_text(file: UploadFile = File(...), filename: Optional[str] = Form(None)):
+async def upload_text(
+    file: UploadFile = File(...),
+    filename: Optional[str] = Form(None),
+):
     orig_name = file.filename or "upload.txt"
 
     if filename:
@@ -221,230 +571,133 @@ async def upload_text(file: UploadFile = File(...), filename: Optional[str] = Fo
     else:
         safe_filename = orig_name if orig_name.lower().endswith(".txt") else orig_name + ".txt"
 
-    try:
-        content_bytes = await file.read()
-        content_str = content_bytes.decode("utf-8")
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Uploaded file must be UTF-8 encoded .txt")
-    except Exception:
-        logger.exception("Error reading uploaded file.")
-        raise HTTPException(status_code=500, detail="Failed to read uploaded file.")
-
-    # Perform transactional insert with explicit id assignment and sequence alignment.
+    base_name = safe_filename.rsplit("/", 1)[-1]
+    stored_filename = base_name
+    state = UploadDecodeState()
+    # The request body is already spooled to disk by the time the handler runs, so the
+    # transaction only spans local reads. Decoded chunks are COPYed into a staging table
+    # and joined by PostgreSQL: neither the full bytes nor the full str is held here.
     async with engine.begin() as conn:
-        # get next logical id
-        result = await conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM documents;"))
-        max_id_row = result.fetchone()
-        next_id = (max_id_row[0] if max_id_row and max_id_row[0] is not None else 0) + 1
-
-        base_name = safe_filename.rsplit("/", 1)[-1]
-        candidate = base_name
-        suffix = 0
-        # check collisions
-        while True:
-            res = await conn.execute(text("SELECT 1 FROM documents WHERE filename = :fn;"), {"fn": candidate})
-            if not res.fetchone():
-                break
-            suffix += 1
-            candidate = f"{Path(base_name).stem}_{suffix}.txt"
+        raw = await conn.get_raw_connection()
+        await conn.execute(SQL_CREATE_UPLOAD_STAGE)
+        await raw.driver_connection.copy_records_to_table(
+            "_stage_upload",
+            records=iter_upload_chunks(file, state),
+            columns=("seq", "chunk"),
+        )
+        if state.invalid:
+            raise HTTPException(status_code=400, detail="Uploaded file must be UTF-8 encoded .txt")
 
-        stored_filename = candidate
+        # the SERIAL sequence assigns the id, UNIQUE(filename) detects collisions
+        res = await conn.execute(SQL_INSERT_STAGED_DOC, {"fn": stored_filename})
+        row = res.fetchone()
 
-        # insert explicit id
-        await conn.execute(
-            text("""
-                INSERT INTO documents (id, filename, content)
-                VALUES (:id, :filename, :content)
-            """),
-            {"id": next_id, "filename": stored_filename, "content": content_str}
-        )
-        # align sequence
-        await conn.execute(
-            text("SELECT setval(pg_get_serial_sequence('documents','id'), :val, true);"),
-            {"val": next_id}
-        )
+        if not row:
+            # name taken: retry once with a random suffix
+            stored_filename = f"{Path(base_name).stem}_{uuid4().hex[:6]}.txt"
+            res = await conn.execute(SQL_INSERT_STAGED_DOC, {"fn": stored_filename})
+            row = res.fetchone()
+
+    if not row:
+        raise HTTPException(status_code=409, detail="Could not allocate a unique filename, please retry.")
 
-    return {"id": next_id, "filename": stored_filename}
+    return {"id": row[0], "filename": stored_filename}
 
 
 @app.delete("/files/{doc_id}")
-async def delete_text(doc_id: int):
-    async with engine.begin() as conn:
-        res = await conn.execute(text("SELECT filename FROM documents WHERE id = :id;"), {"id": doc_id})
-        row = res.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        filename = row[0]
-        await conn.execute(text("DELETE FROM documents WHERE id = :id;"), {"id": doc_id})
-    return {"message": f"Document {doc_id} ({filename}) deleted (analysis removed via cascade if present)."}
+async def delete_text(doc_id: int, conn: AsyncConnection = Depends(dbtx)):
+    res = await conn.execute(SQL_DELETE_DOC, {"id": doc_id})
+    row = res.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return {"message": f"Document {doc_id} ({row[0]}) deleted (analysis removed via cascade if present)."}
 
 
 @app.get("/download/{doc_id}.txt")
-async def download_text(doc_id: int):
-    async with engine.connect() as conn:
-        res = await conn.execute(text("SELECT filename, content FROM documents WHERE id = :id;"), {"id": doc_id})
-        row = res.fetchone()
+async def download_text(doc_id: int, conn: AsyncConnection = Depends(db)):
+    row = await fetch_document(conn, doc_id)
 
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    filename, content = row[0], row[1]
-    buffer = BytesIO(content.encode("utf-8"))
-
     headers = {
-        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Disposition": f'attachment; filename="{row[1]}"',
         "Content-Type": "text/plain; charset=utf-8",
     }
-    return StreamingResponse(buffer, headers=headers)
+    # content is fetched once; only the encoded bytes are produced chunk by chunk
+    return StreamingResponse(iter_utf8_chunks(row[2]), headers=headers)
 
 
 @app.get("/analyze/{doc_id}")
 async def analyze_file(doc_id: int):
+    # short-lived connection: it goes back to the pool before the NLP work starts
     async with engine.connect() as conn:
-        res = await conn.execute(text("SELECT content FROM documents WHERE id = :id;"), {"id": doc_id})
+        res = await conn.execute(SQL_FETCH_DOC_CONTENT, {"id": doc_id})
         row = res.fetchone()
 
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    analysis = await run_nlp_analysis(row[0])
-    return analysis
+    return await analyze_text_cached(row[0])
 
 @app.post("/analyze-and-store/{doc_id}")
 async def analyze_and_store(doc_id: int):
-    # fetch content
+    # separate short-lived connections for the fetch and the store, none held during NLP
     async with engine.connect() as conn:
-        res = await conn.execute(
-            text("SELECT content FROM documents WHERE id = :id;"),
-            {"id": doc_id}
-        )
+        res = await conn.execute(SQL_FETCH_DOC_CONTENT, {"id": doc_id})
         row = res.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    analysis = await run_nlp_analysis(row[0])
+    analysis = await analyze_text_cached(row[0])
 
     # store analysis
     async with engine.begin() as conn:
         await conn.execute(
-            text("""
-            INSERT INTO analyses (
-                document_id, tokens, lemmas, morphs, dependencies, entities, word_vectors
-            )
-            VALUES (
-                :document_id,
-                CAST(:tokens AS jsonb),
-                CAST(:lemmas AS jsonb),
-                CAST(:morphs AS jsonb),
-                CAST(:dependencies AS jsonb),
-                CAST(:entities AS jsonb),
-                CAST(:word_vectors AS jsonb)
-            )
-            ON CONFLICT (document_id) DO UPDATE
-            SET tokens = EXCLUDED.tokens,
-                lemmas = EXCLUDED.lemmas,
-                morphs = EXCLUDED.morphs,
-                dependencies = EXCLUDED.dependencies,
-                entities = EXCLUDED.entities,
-                word_vectors = EXCLUDED.word_vectors;
-            """),
-            {
-                "document_id": doc_id,
-                "tokens": json.dumps(analysis["tokens"], ensure_ascii=False),
-                "lemmas": json.dumps(analysis["lemmas"], ensure_ascii=False),
-                "morphs": json.dumps(analysis["morphs"], ensure_ascii=False),
-                "dependencies": json.dumps(analysis["dependencies"], ensure_ascii=False),
-                "entities": json.dumps(analysis["entities"], ensure_ascii=False),
-                "word_vectors": json.dumps(analysis["word_vectors"], ensure_ascii=False),
-            }
+            SQL_STORE_ANALYSIS,
+            {"document_id": doc_id, **{k: analysis[k] for k in ANALYSIS_FIELDS}}
         )
 
     return {"message": "Full NLP analysis (with simplified vectors) stored successfully"}
 
 @app.get("/analysis/{doc_id}")
-async def get_analysis(doc_id: int):
-    async with engine.connect() as conn:
-        res = await conn.execute(text("""
-            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors
-            FROM analyses
-            WHERE document_id = :id;
-        """), {"id": doc_id})
-        row = res.fetchone()
+async def get_analysis(doc_id: int, conn: AsyncConnection = Depends(db)):
+    res = await conn.execute(SQL_GET_ANALYSIS, {"id": doc_id})
+    row = res.fetchone()
 
     if not row:
         raise HTTPException(status_code=404, detail="Analysis not found for this document.")
 
-    # row values are JSON strings (because we inserted as jsonb). AsyncPG should return them decoded,
-    # but to be robust, ensure they are Python objects.
-    def _maybe_load(val):
-        if val is None:
-            return None
-        if isinstance(val, (dict, list)):
-            return val
-        try:
-            return json.loads(val)
-        except Exception:
-            return val
-
-    return {
-        "tokens": _maybe_load(row[0]),
-        "lemmas": _maybe_load(row[1]),
-        "morphs": _maybe_load(row[2]),
-        "dependencies": _maybe_load(row[3]),
-        "entities": _maybe_load(row[4]),
-        "word_vectors": _maybe_load(row[5]),
-    }
+    # jsonb columns are decoded by the connection's orjson codec
+    return dict(zip(ANALYSIS_FIELDS, row))
 
 
 @app.get("/download-analysis/{doc_id}.json")
-async def download_analysis(doc_id: int):
-    async with engine.connect() as conn:
-        res = await conn.execute(text("""
-            SELECT tokens, lemmas, morphs, dependencies, entities, word_vectors
-            FROM analyses
-            WHERE document_id = :id;
-        """), {"id": doc_id})
-        row = res.fetchone()
+async def download_analysis(doc_id: int, conn: AsyncConnection = Depends(db)):
+    res = await conn.execute(SQL_GET_ANALYSIS, {"id": doc_id})
+    row = res.fetchone()
 
     if not row:
         raise HTTPException(status_code=404, detail="Analysis not found for this document.")
 
-    def _maybe_load(val):
-        if val is None:
-            return None
-        if isinstance(val, (dict, list)):
-            return val
-        try:
-            return json.loads(val)
-        except Exception:
-            return val
-
-    analysis_obj = {
-        "document_id": doc_id,
-        "tokens": _maybe_load(row[0]),
-        "lemmas": _maybe_load(row[1]),
-        "morphs": _maybe_load(row[2]),
-        "dependencies": _maybe_load(row[3]),
-        "entities": _maybe_load(row[4]),
-        "word_vectors": _maybe_load(row[5]),
-    }
+    analysis_obj = {"document_id": doc_id, **dict(zip(ANALYSIS_FIELDS, row))}
 
-    data_bytes = json.dumps(analysis_obj, ensure_ascii=False, indent=2).encode("utf-8")
-    buffer = BytesIO(data_bytes)
+    data_bytes = await asyncio.get_running_loop().run_in_executor(
+        None, orjson.dumps, analysis_obj, None, orjson.OPT_INDENT_2
+    )
     headers = {
         "Content-Disposition": f'attachment; filename="analysis_{doc_id}.json"',
         "Content-Type": "application/json; charset=utf-8",
     }
-    return StreamingResponse(buffer, headers=headers)
+    return Response(content=data_bytes, headers=headers)
 
 
 @app.delete("/analysis/{doc_id}")
-async def delete_analysis(doc_id: int):
-    async with engine.begin() as conn:
-        res = await conn.execute(text("SELECT 1 FROM analyses WHERE document_id = :id;"), {"id": doc_id})
-        if not res.fetchone():
-            raise HTTPException(status_code=404, detail="Analysis not found for this document")
-        await conn.execute(text("DELETE FROM analyses WHERE document_id = :id;"), {"id": doc_id})
+async def delete_analysis(doc_id: int, conn: AsyncConnection = Depends(dbtx)):
+    res = await conn.execute(SQL_DELETE_ANALYSIS, {"id": doc_id})
+    row = res.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Analysis not found for this document")
     return {"message": f"Analysis for document {doc_id} deleted successfully."}
 
 @app.on_event("shutdown")
@@ -455,11 +708,20 @@ async def shutdown_event():
     """
     logger.info("Shutting down FastAPI gracefully...")
 
+    # Stop the NLP batcher (fails any requests still queued)
+    global nlp_batcher
+    if nlp_batcher is not None:
+        await nlp_batcher.stop()
+        nlp_batcher = None
+        logger.info("NLP batcher stopped.")
+
     # Dispose async SQLAlchemy engine (closes all connections in pool)
     if 'engine' in globals() and engine is not None:
         await engine.dispose()
         logger.info("Async DB engine disposed.")
 
+    analysis_cache.clear()
+
     # Clear spaCy model from memory
     global nlp_model
     if nlp_model is not None:
@@ -0,0 +1,27 @@
+# setup.py
+"""
+Builds the optional analyzer_ext Cython extension in place:
+    python setup.py build_ext --inplace
+main.py falls back to the pure-Python extractor when it is not built.
+"""
+
+import numpy
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+setup(
+    name="analyzer_ext",
+    ext_modules=cythonize(
+        [
+            Extension(
+                "analyzer_ext",
+                ["analyzer_ext.pyx"],
+                include_dirs=[numpy.get_include()],
+                # spaCy's .pxd headers cimport libcpp, so the module must be C++
+                language="c++",
+                extra_compile_args=["-std=c++11"],
+            )
+        ],
+        language_level=3,
+    ),
+)
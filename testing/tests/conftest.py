@@ -23,7 +23,8 @@ def wait_for_api():
     print("Waiting for FastAPI…")
     for _ in range(40):
         try:
-            r = httpx.get(f"{TEST_API_URL}/", timeout=2)
+            # /readyz only answers 200 once the spaCy model is loaded and the DB is reachable
+            r = httpx.get(f"{TEST_API_URL}/readyz", timeout=2)
             if r.status_code == 200:
                 print("FastAPI is ready.")
                 return
@@ -1,4 +1,5 @@
 # tests/test_analysis.py
+import asyncio
 import pytest
 
 @pytest.mark.asyncio
@@ -30,3 +31,68 @@ async def test_download_analysis(client, sample_file_id):
     r = await client.get(f"/download-analysis/{sample_file_id}.json")
     assert r.status_code == 200
     assert "application/json" in r.headers["content-type"]
+    data = r.json()
+    assert data["document_id"] == sample_file_id
+    assert len(data["tokens"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_analysis_batched(client, reset_db):
+    # Distinct documents analyzed concurrently land in the same nlp.pipe() batch;
+    # each request must get back the result for its own document, not a neighbour's
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+    ids = []
+    for word in words:
+        files = {"file": (f"{word}.txt", f"The {word} document.".encode(), "text/plain")}
+        r = await client.post("/upload", files=files)
+        assert r.status_code == 201
+        ids.append(r.json()["id"])
+
+    responses = await asyncio.gather(*[
+        client.get(f"/analyze/{doc_id}", timeout=20.0) for doc_id in ids
+    ])
+    assert all(r.status_code == 200 for r in responses)
+    for word, r in zip(words, responses):
+        assert r.json()["tokens"] == ["The", word, "document", "."]
+
+
+@pytest.mark.asyncio
+async def test_analysis_response_gzipped(client, sample_file_id):
+    await client.post(f"/analyze-and-store/{sample_file_id}", timeout=20.0)
+
+    r = await client.get(f"/analysis/{sample_file_id}", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers.get("content-encoding") == "gzip"
+    assert "tokens" in r.json()
+
+    r2 = await client.get(f"/analysis/{sample_file_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r2.headers
+
+
+def test_cython_extractor_matches_python():
+    # The compiled extractor reads TokenC fields directly; it must produce
+    # exactly what the pure-Python fallback produces for the same Doc
+    analyzer_ext = pytest.importorskip("analyzer_ext")
+    import main
+
+    nlp = main.load_nlp()
+    doc = nlp("Apple's CEO didn't meet 3 reporters in San Francisco. They left early, quietly.")
+    has_vec, norms = main._vector_norms(doc)
+    assert analyzer_ext.extract(doc, has_vec, norms) == main._extract_py(doc, has_vec, norms)
+
+
+@pytest.mark.asyncio
+async def test_oversized_document_does_not_fail_batch(client, reset_db):
+    # spaCy rejects texts over nlp.max_length (1,000,000 chars by default);
+    # that must not fail the normal document analyzed in the same batch
+    big = await client.post("/upload", files={"file": ("big.txt", b"a " * 600000, "text/plain")})
+    small = await client.post("/upload", files={"file": ("small.txt", b"A normal document.", "text/plain")})
+    assert big.status_code == 201 and small.status_code == 201
+
+    r_big, r_small = await asyncio.gather(
+        client.get(f"/analyze/{big.json()['id']}", timeout=20.0),
+        client.get(f"/analyze/{small.json()['id']}", timeout=20.0),
+    )
+    assert r_big.status_code == 413
+    assert r_small.status_code == 200
+    assert r_small.json()["tokens"] == ["A", "normal", "document", "."]
@@ -27,6 +27,24 @@ async def test_download_raw_text(client, sample_file_id):
     assert "text/plain" in r.headers["content-type"]
 
 
+@pytest.mark.asyncio
+async def test_download_large_text_streams_in_chunks(client, reset_db):
+    # larger than one 64K-character chunk, with multi-byte characters across boundaries
+    content = ("héllo wörld " * 20000).encode("utf-8")
+    r = await client.post("/upload", files={"file": ("big.txt", content, "text/plain")})
+    file_id = r.json()["id"]
+
+    r2 = await client.get(f"/download/{file_id}.txt")
+    assert r2.status_code == 200
+    assert r2.content == content
+
+
+@pytest.mark.asyncio
+async def test_download_missing_text(client, reset_db):
+    r = await client.get("/download/999999.txt")
+    assert r.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_delete_file(client, sample_file_id):
     r = await client.delete(f"/files/{sample_file_id}")
@@ -16,3 +16,17 @@ async def test_tables_exist(client):
     r = await client.get("/files")
     assert r.status_code == 200
     assert isinstance(r.json(), list)
+
+
+@pytest.mark.asyncio
+async def test_healthz(client):
+    r = await client.get("/healthz")
+    assert r.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_readyz_after_startup(client):
+    # the session fixture already waited on /readyz, so the model and DB must be ready
+    r = await client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json() == {"ok": True}
@@ -20,3 +20,38 @@ async def test_upload_rejects_non_utf8(client, reset_db):
     }
     r = await client.post("/upload", files=files)
     assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_duplicate_filename_gets_new_name(client, reset_db):
+    files = {"file": ("dup.txt", b"first", "text/plain")}
+    r1 = await client.post("/upload", files=files)
+    r2 = await client.post("/upload", files={"file": ("dup.txt", b"second", "text/plain")})
+    assert r1.status_code == 201 and r2.status_code == 201
+    assert r1.json()["filename"] == "dup.txt"
+    assert r2.json()["filename"] != "dup.txt"
+    assert r2.json()["filename"].startswith("dup_")
+    assert r2.json()["id"] != r1.json()["id"]
+
+
+@pytest.mark.asyncio
+async def test_upload_multibyte_across_chunk_boundary(client, reset_db):
+    # odd prefix so a 2-byte character straddles the 64 KiB read boundary
+    content = "a" + "é" * 40000
+    files = {"file": ("accents.txt", content.encode("utf-8"), "text/plain")}
+    r = await client.post("/upload", files=files)
+    assert r.status_code == 201
+
+    r2 = await client.get(f"/files/{r.json()['id']}")
+    assert r2.json()["content"] == content
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_truncated_utf8(client, reset_db):
+    # a character cut off at the very end only fails in the final decode step
+    files = {"file": ("cut.txt", "ok é".encode("utf-8")[:-1], "text/plain")}
+    r = await client.post("/upload", files=files)
+    assert r.status_code == 400
+
+    r2 = await client.get("/files")
+    assert all(f["filename"] != "cut.txt" for f in r2.json())